@@ -22,6 +22,13 @@ from rag.llm import SimpleLLM
 # 加载环境变量
 load_dotenv()
 
+@st.cache_resource
+def get_qa_chain(model_name: str) -> LegalQAChain:
+    """创建并缓存问答链，避免每次重新运行脚本时重复加载嵌入模型"""
+    llm = SimpleLLM()
+    return LegalQAChain(llm_model=llm)
+
+
 # 配置页面
 st.set_page_config(
     page_title="法律RAG助手",
@@ -33,11 +40,15 @@ st.set_page_config(
 # --- 会话状态管理 ---
 if "messages" not in st.session_state:
     st.session_state.messages = []
-if "qa_chain" not in st.session_state:
-    st.session_state.qa_chain = None
 
 # --- 应用侧边栏 ---
-with st.sidebar:
+@st.fragment
+def render_settings():
+    """
+    渲染设置项。
+    设置项放在fragment中，调整滑块等控件时只重新运行本函数，
+    不会重新渲染整个聊天历史
+    """
     st.header("设置")
     
     # 选择LLM模型
@@ -48,17 +59,22 @@ with st.sidebar:
     )
     
     # 设置模型温度
-    temperature = st.slider(
+    st.slider(
         "模型温度", 
         min_value=0.0, 
         max_value=1.0, 
         value=0.1, 
         step=0.05,
+        key="temperature",
         help="温度越高，回答越有创造性但可能不准确；温度越低，回答越保守和一致。"
     )
 
     # 显示相关法律条文的选项
-    show_source = st.checkbox("显示相关法律条文", value=True)
+    st.checkbox("显示相关法律条文", value=True, key="show_source")
+
+
+with st.sidebar:
+    render_settings()
     
     st.info(
         """
@@ -72,13 +88,10 @@ with st.sidebar:
     st.markdown("© 2023 法律RAG助手 - 基于LangChain和Streamlit构建")
 
 # --- 初始化问答链 ---
-# 仅在需要时（首次运行或参数更改时）重新创建实例
-if st.session_state.qa_chain is None or st.session_state.qa_chain.llm.temperature != temperature:
-    llm = SimpleLLM()
-    st.session_state.qa_chain = LegalQAChain(
-        llm_model=llm,
-        temperature=temperature
-    )
+# 问答链（嵌入模型 + 向量索引）只按模型名称缓存一次，由所有会话共享，
+# 因此不修改其状态，温度在每次调用时传入
+qa_chain = get_qa_chain(st.session_state.selected_model)
+show_source = st.session_state.show_source
 
 # --- 主界面 ---
 st.title("⚖️ 法律RAG助手")
@@ -106,43 +119,37 @@ with tab_qa:
         with st.chat_message("user"):
             st.markdown(prompt)
 
-        # 显示"思考中"的动画
         with st.chat_message("assistant"):
-            with st.spinner("正在检索法律条文并生成回答..."):
-                # 运行问答链
-                response = st.session_state.qa_chain.run(prompt, show_source=show_source)
-                
-                answer = response["answer"]
+            # 显示"检索中"的动画
+            with st.spinner("正在检索法律条文..."):
+                # 运行问答链，检索完成后即返回答案生成器
+                response = qa_chain.stream(
+                    prompt,
+                    show_source=show_source,
+                    temperature=st.session_state.temperature
+                )
                 source_documents = response.get("source_documents", [])
-                
-                # 创建助手的完整回复
-                full_response_content = answer
-                
-                st.markdown(full_response_content)
-                
-                # 如果有源文档，则在可折叠区域中显示
-                if show_source and source_documents:
-                    with st.expander("参考法条", expanded=True):
-                        for source in source_documents:
-                            # 使用更醒目的样式显示法条信息
-                            st.markdown(f"**来源: {source['source']} - {source['article']}**")
-                            
-                            # 使用引用块和更好的格式显示法条内容
-                            content = source['content']
-                            # 如果内容太长，截断显示
-                            if len(content) > 500:
-                                content = content[:500] + "..."
-                                
-                            # 添加额外的格式增强可读性
-                            st.markdown(f"<div style='background-color: #f0f2f6; padding: 10px; border-radius: 5px;'>{content}</div>", unsafe_allow_html=True)
-                            st.markdown("---")
-
-                # 将助手的回复（包括源文档信息）添加到消息历史
-                st.session_state.messages.append({
-                    "role": "assistant", 
-                    "content": full_response_content,
-                    "sources": source_documents if show_source else []
-                })
+
+            # 流式显示回答，并获取完整的回复内容
+            full_response_content = st.write_stream(response["answer_stream"])
+
+            # 如果有源文档，则在可折叠区域中显示
+            if show_source and source_documents:
+                with st.expander("参考法条", expanded=True):
+                    for source in source_documents:
+                        # 使用更醒目的样式显示法条信息
+                        st.markdown(f"**来源: {source['source']} - {source['article']}**")
+                        
+                        # 使用预先生成的HTML片段显示法条内容（已截断）
+                        st.markdown(source['html_blob'], unsafe_allow_html=True)
+                        st.markdown("---")
+
+            # 将助手的回复（包括源文档信息）添加到消息历史
+            st.session_state.messages.append({
+                "role": "assistant", 
+                "content": full_response_content,
+                "sources": source_documents if show_source else []
+            })
 
 with tab_instructions:
     st.header("使用说明")
@@ -9,8 +9,9 @@ import os
 import re
 import json
 import numpy as np
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
-from typing import List, Dict, Any, Tuple
+from typing import List, Any, Tuple
 
 import chromadb
 
@@ -28,28 +29,31 @@ DATA_DIR = BASE_DIR / "data"
 VECTOR_STORE_DIR = BASE_DIR / "vector_store"
 # 使用一个轻量级、高效的中文句向量模型
 EMBEDDING_MODEL_NAME = 'infgrad/stella-base-zh-v2'
+# 精确检索使用的向量矩阵和元数据文件
+EMBEDDINGS_FILE = VECTOR_STORE_DIR / "embeddings.npy"
+METADATA_FILE = VECTOR_STORE_DIR / "metadata.jsonl"
 
 # 确保向量存储目录存在
 VECTOR_STORE_DIR.mkdir(exist_ok=True, parents=True)
 
 # ----------------- 智能文本分割器 -----------------
 
+# 匹配行首的"第X条"模式，X可以是中文数字或阿拉伯数字（模块加载时编译一次）
+# 只匹配行首，避免在"依照本法第二十四条、第二十六条"这类条文内引用处切分
+ARTICLE_PATTERN = re.compile(r'^\s*第[一二三四五六七八九十百零\d]+条', re.M)
+
 def split_law_text_by_article(text: str) -> List[str]:
     """
     使用正则表达式按"第X条"来分割法律文本。
     每个分块包含一条完整的法条。
     """
-    # 正则表达式匹配"第X条"模式，X可以是中文数字或阿拉伯数字
-    # 使用正向先行断言 (?=...) 来保留分隔符（即"第X条"）在每个分块的开头
-    pattern = r'(?=第[一二三四五六七八九十百\\d]+条)'
-    
-    # 使用 re.split 来分割文本
-    chunks = re.split(pattern, text)
-    
-    # 过滤掉可能产生的空字符串（通常是第一个）
-    cleaned_chunks = [chunk.strip() for chunk in chunks if chunk.strip()]
-    
-    return cleaned_chunks
+    # 以每个"第X条"的起始位置作为切分点，保留分隔符在每个分块的开头
+    starts = [m.start() for m in ARTICLE_PATTERN.finditer(text)]
+    boundaries = [0] + starts + [len(text)]
+
+    # 按切分点切片，并过滤掉可能产生的空字符串（通常是第一个）
+    chunks = (text[a:b].strip() for a, b in zip(boundaries, boundaries[1:]))
+    return [chunk for chunk in chunks if chunk]
 
 
 # ----------------- 旧的文本分割器配置 (不再使用) -----------------
@@ -84,36 +88,51 @@ def load_and_split_text(file_path: str) -> List[Tuple[str, str, str]]:
         return []
 
 
-def create_embeddings(chunks: List[Tuple[str, str, str]], model: Any) -> List[Dict[str, Any]]:
-    """为文本块创建嵌入向量"""
+def create_embeddings(
+    chunks: List[Tuple[str, str, str]], model: Any
+) -> Tuple[List[str], List[str], List[str], np.ndarray]:
+    """
+    为文本块创建嵌入向量
+
+    Returns:
+        (ids, texts, sources, embeddings) 按列组织的结果，embeddings 为 (N, D) 的 float32 数组
+    """
     
-    # 提取所有文本内容以进行批量编码
+    # 按列拆分文本块，提取所有文本内容以进行批量编码
+    ids = [chunk_id for chunk_id, _, _ in chunks]
     texts_to_embed = [text for _, text, _ in chunks]
+    sources = [source for _, _, source in chunks]
     
     if hasattr(model, 'encode'):
         # 使用真实的SentenceTransformer模型
         print(f"  正在使用模型 '{EMBEDDING_MODEL_NAME}' 生成 {len(texts_to_embed)} 个嵌入...")
-        embeddings = model.encode(texts_to_embed, show_progress_bar=True)
+        # 一次性批量编码，sentence-transformers 内部会按长度排序分批，减少padding
+        embeddings = model.encode(
+            texts_to_embed,
+            batch_size=64,
+            show_progress_bar=True,
+            convert_to_numpy=True,
+            normalize_embeddings=True
+        )
     else:
         # 使用简单的随机嵌入（备用方案）
         print(f"  使用备用随机嵌入生成 {len(texts_to_embed)} 个嵌入...")
         # 为每个文本生成一个随机向量，但保持向量维度一致
         # 注意：这只是一个备用方案，实际效果会很差
-        embeddings = [np.random.randn(VECTOR_DIMENSION).astype(np.float32) for _ in texts_to_embed]
-    
-    embedded_docs = []
-    for i, (chunk_id, text, source) in enumerate(chunks):
-        embedded_docs.append({
-            'id': chunk_id,
-            'text': text,
-            'source': source,
-            'embedding': embeddings[i].tolist() if hasattr(embeddings[i], 'tolist') else embeddings[i] # 转换为list以便JSON序列化
-        })
+        embeddings = np.random.randn(len(texts_to_embed), VECTOR_DIMENSION).astype(np.float32)
+        # 归一化为单位向量，使内积等价于余弦相似度
+        embeddings /= np.linalg.norm(embeddings, axis=1, keepdims=True)
+
+    # Chroma 内部（SQLite 与 HNSW 索引）均以 float32 存储向量，
+    # 以更低精度写入并不会减少存储，因此统一为 float32，避免任何 float64 的中间副本
+    embeddings = np.asarray(embeddings, dtype=np.float32)
     
-    return embedded_docs
+    return ids, texts_to_embed, sources, embeddings
 
 
-def save_to_chroma(records: List[Dict[str, Any]]) -> None:
+def save_to_chroma(
+    ids: List[str], texts: List[str], sources: List[str], embeddings: np.ndarray
+) -> None:
     """将文档及其嵌入保存到Chroma向量数据库"""
     
     client = chromadb.PersistentClient(path=str(VECTOR_STORE_DIR))
@@ -124,31 +143,75 @@ def save_to_chroma(records: List[Dict[str, Any]]) -> None:
     except ValueError:
         print("集合 'legal_documents' 不存在，将创建新集合。")
 
+    # 向量已归一化，使用内积距离（等价于余弦相似度）；
+    # search_ef 针对 top_k=4 的检索设置，在召回率接近精确检索的同时保持较少的探测次数
     collection = client.get_or_create_collection(
         name="legal_documents",
-        metadata={"description": "法律文档集合"}
+        metadata={
+            "description": "法律文档集合",
+            "hnsw:space": "ip",
+            "hnsw:M": 32,
+            "hnsw:construction_ef": 200,
+            "hnsw:search_ef": 32
+        }
     )
     
-    ids = [r['id'] for r in records]
-    documents = [r['text'] for r in records]
-    metadatas = [{'source': r['source']} for r in records]
-    embeddings = [r['embedding'] for r in records]
-    
+    # 整个数组一次性转换为list，避免逐行调用 tolist()
     collection.add(
         ids=ids,
-        documents=documents,
-        metadatas=metadatas,
-        embeddings=embeddings
+        documents=texts,
+        metadatas=[{'source': source} for source in sources],
+        embeddings=embeddings.tolist()
     )
     
     print(f"成功保存 {len(ids)} 条文档到Chroma数据库")
 
 
+def save_to_numpy(
+    ids: List[str], texts: List[str], sources: List[str], embeddings: np.ndarray
+) -> None:
+    """
+    将归一化后的向量矩阵和元数据保存为文件，供问答链做精确的矩阵乘法检索。
+    法条数量只有几百条，远小于HNSW的收益临界点，一次矩阵向量乘法即可得到精确的top-k。
+    """
+    np.save(EMBEDDINGS_FILE, embeddings.astype(np.float32, copy=False))
+
+    with open(METADATA_FILE, 'w', encoding='utf-8') as f:
+        for chunk_id, text, source in zip(ids, texts, sources):
+            record = {'id': chunk_id, 'text': text, 'source': source}
+            f.write(json.dumps(record, ensure_ascii=False) + "\n")
+
+    print(f"成功保存 {len(ids)} 条向量到 {EMBEDDINGS_FILE.name}")
+
+
 def main():
     """主函数：处理文本嵌入"""
     
+    # 获取所有文本文件路径
+    file_paths = [str(f) for f in DATA_DIR.glob("*.txt")]
+    print(f"找到 {len(file_paths)} 个文本文件")
+    
+    # 在加载嵌入模型之前，先加载和分割所有文档，避免子进程复制模型权重；
+    # 只有多个文件时才使用进程池，进程数不超过文件数
+    if len(file_paths) > 1:
+        max_workers = min(len(file_paths), os.cpu_count() or 1)
+        with ProcessPoolExecutor(max_workers=max_workers) as executor:
+            per_file_chunks = list(executor.map(load_and_split_text, file_paths))
+    else:
+        per_file_chunks = [load_and_split_text(file_path) for file_path in file_paths]
+
+    all_chunks = []
+    for file_path, chunks in zip(file_paths, per_file_chunks):
+        print(f"处理文件: {os.path.basename(file_path)}")
+        print(f"  文件被分割为 {len(chunks)} 个文本块")
+        all_chunks.extend(chunks)
+    
     # 加载嵌入模型
     try:
+        # 使用全部CPU核心进行推理
+        import torch
+        torch.set_num_threads(os.cpu_count() or 1)
+
         print(f"正在加载句向量模型: {EMBEDDING_MODEL_NAME}...")
         model = SentenceTransformer(EMBEDDING_MODEL_NAME)
         print("模型加载完毕。")
@@ -159,27 +222,15 @@ def main():
         class SimpleEmbeddingModel:
             pass
         model = SimpleEmbeddingModel()
-    
-    # 获取所有文本文件路径
-    file_paths = [str(f) for f in DATA_DIR.glob("*.txt")]
-    print(f"找到 {len(file_paths)} 个文本文件")
-    
-    # 处理所有文档
-    all_documents = []
-    for file_path in file_paths:
-        print(f"处理文件: {os.path.basename(file_path)}")
-        # 加载和分割文本
-        chunks = load_and_split_text(file_path)
-        print(f"  文件被分割为 {len(chunks)} 个文本块")
-        
-        # 创建嵌入
-        embedded_docs = create_embeddings(chunks, model)
-        all_documents.extend(embedded_docs)
-        print(f"  成功创建了 {len(embedded_docs)} 个文本嵌入")
+
+    # 对所有文本块进行一次批量编码
+    ids, texts, sources, embeddings = create_embeddings(all_chunks, model)
+    print(f"成功创建了 {len(ids)} 个文本嵌入")
     
     # 保存到Chroma
-    print(f"保存 {len(all_documents)} 个嵌入到向量数据库...")
-    save_to_chroma(all_documents)
+    print(f"保存 {len(ids)} 个嵌入到向量数据库...")
+    save_to_chroma(ids, texts, sources, embeddings)
+    save_to_numpy(ids, texts, sources, embeddings)
     print("处理完成!")
 
 
@@ -0,0 +1,137 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+句向量模型封装：
+- ONNXEmbeddings: 基于 ONNX Runtime 的int8量化模型（CPU 推理）
+- SentenceTransformerEmbeddings: 基于 sentence-transformers 的PyTorch模型（有GPU时自动使用）
+"""
+
+from pathlib import Path
+from typing import List
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+# 尝试导入ONNX Runtime相关依赖，如果失败则准备使用备用方案
+try:
+    from optimum.onnxruntime import ORTModelForFeatureExtraction
+    from transformers import AutoTokenizer
+    ONNX_RUNTIME_AVAILABLE = True
+except ImportError:
+    ONNX_RUNTIME_AVAILABLE = False
+
+try:
+    import torch
+    from sentence_transformers import SentenceTransformer
+    SENTENCE_TRANSFORMER_AVAILABLE = True
+except ImportError:
+    SENTENCE_TRANSFORMER_AVAILABLE = False
+
+# 是否可以使用GPU进行推理
+CUDA_AVAILABLE = SENTENCE_TRANSFORMER_AVAILABLE and torch.cuda.is_available()
+
+# --- 全局配置 ---
+BASE_DIR = Path(__file__).resolve().parent.parent
+# 由 scripts/export_onnx_model.py 导出并量化后的模型目录
+ONNX_MODEL_DIR = BASE_DIR / "models" / "stella-base-zh-v2-onnx-int8"
+
+
+class ONNXEmbeddings(Embeddings):
+    """
+    使用 ONNX Runtime 运行量化后的句向量模型。
+    输出经过均值池化和L2归一化，与 SentenceTransformer 的结果保持一致。
+    """
+
+    def __init__(self, model_dir: Path = ONNX_MODEL_DIR, batch_size: int = 32, max_length: int = 512):
+        """
+        初始化ONNX嵌入模型
+
+        Args:
+            model_dir: 量化后的ONNX模型目录
+            batch_size: 批量编码时每批的文本数量
+            max_length: 分词后的最大长度
+        """
+        if not ONNX_RUNTIME_AVAILABLE:
+            raise ImportError("未安装ONNX Runtime依赖，请执行: pip install optimum[onnxruntime]")
+
+        self.tokenizer = AutoTokenizer.from_pretrained(str(model_dir))
+        self.model = ORTModelForFeatureExtraction.from_pretrained(
+            str(model_dir),
+            file_name="model_quantized.onnx",
+            provider="CPUExecutionProvider",
+        )
+        self.batch_size = batch_size
+        self.max_length = max_length
+
+    def _encode(self, texts: List[str]) -> np.ndarray:
+        """对一批文本进行编码，返回归一化后的向量"""
+        inputs = self.tokenizer(
+            texts,
+            padding=True,
+            truncation=True,
+            max_length=self.max_length,
+            return_tensors="np",
+        )
+        outputs = self.model(**inputs)
+        token_embeddings = outputs.last_hidden_state
+
+        # 均值池化（忽略padding位置）
+        mask = inputs["attention_mask"][..., None].astype(np.float32)
+        summed = (token_embeddings * mask).sum(axis=1)
+        counts = np.clip(mask.sum(axis=1), 1e-9, None)
+        embeddings = summed / counts
+
+        # L2归一化
+        norms = np.linalg.norm(embeddings, axis=1, keepdims=True)
+        return embeddings / np.clip(norms, 1e-12, None)
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        """批量编码文档"""
+        results = []
+        for i in range(0, len(texts), self.batch_size):
+            results.extend(self._encode(texts[i:i + self.batch_size]).tolist())
+        return results
+
+    def embed_query(self, text: str) -> List[float]:
+        """编码单个查询"""
+        return self._encode([text])[0].tolist()
+
+
+class SentenceTransformerEmbeddings(Embeddings):
+    """
+    直接使用 SentenceTransformer 进行编码，有GPU时自动使用GPU。
+    输出经过L2归一化，与索引时的向量保持一致。
+    """
+
+    def __init__(self, model_name: str, batch_size: int = 32):
+        """
+        初始化句向量模型
+
+        Args:
+            model_name: 模型名称或本地路径
+            batch_size: 批量编码时每批的文本数量
+        """
+        if not SENTENCE_TRANSFORMER_AVAILABLE:
+            raise ImportError("未安装sentence-transformers，请执行: pip install sentence-transformers")
+
+        device = 'cuda' if CUDA_AVAILABLE else 'cpu'
+        self.model = SentenceTransformer(model_name, device=device)
+        self.batch_size = batch_size
+
+    def _encode(self, texts: List[str]) -> np.ndarray:
+        """对文本进行编码，返回归一化后的向量"""
+        return self.model.encode(
+            texts,
+            batch_size=self.batch_size,
+            convert_to_numpy=True,
+            normalize_embeddings=True
+        )
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        """批量编码文档"""
+        return self._encode(texts).tolist()
+
+    def embed_query(self, text: str) -> List[float]:
+        """编码单个查询"""
+        return self._encode([text])[0].tolist()
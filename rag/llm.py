@@ -5,9 +5,16 @@
 简单的本地LLM实现
 """
 
-from typing import Any, List, Mapping, Optional
+import re
+from typing import Any, Dict, Iterator, List, Mapping, Optional
 from langchain_core.language_models.llms import LLM
 from langchain_core.callbacks.manager import CallbackManagerForLLMRun
+from langchain_core.outputs import GenerationChunk
+
+# 一次扫描同时提取提示中的上下文和问题
+PROMPT_PATTERN = re.compile(r'\[已知信息\]\s*(.*?)\s*\[问题\]\s*(.*?)\s*\[回答\]', re.DOTALL)
+# 匹配"第X条"法条编号
+ARTICLE_PATTERN = re.compile(r'第([一二三四五六七八九十百零\d]+)条')
 
 
 class SimpleLLM(LLM):
@@ -27,22 +34,24 @@ class SimpleLLM(LLM):
         prompt: str,
         stop: Optional[List[str]] = None,
         run_manager: Optional[CallbackManagerForLLMRun] = None,
+        article_index: Optional[Dict[str, str]] = None,
+        temperature: Optional[float] = None,
         **kwargs: Any,
     ) -> str:
         """
         使用简单的规则生成回答
         这里只是一个演示用的实现，实际应用中应替换为真实的LLM API调用
+
+        Args:
+            article_index: 可选的 {法条编号: 法条全文} 索引，提供时直接按编号查找法条
+            temperature: 本次调用的温度，覆盖实例的默认温度（规则实现不使用温度）
         """
         # 基于提示词中的内容生成简单回答
         # 从提示中提取问题和上下文
         try:
             # 尝试解析提示中的问题和上下文
-            sections = prompt.split("[")
-            context_section = next((s for s in sections if s.startswith("已知信息]")), "")
-            question_section = next((s for s in sections if s.startswith("问题]")), "")
-            
-            context = context_section.replace("已知信息]\n", "").strip()
-            question = question_section.replace("问题]\n", "").strip()
+            match = PROMPT_PATTERN.search(prompt)
+            context, question = (match.group(1), match.group(2)) if match else ("", "")
             
             # 如果上下文为空或者问题与上下文无关，返回通用回答
             if not context or len(context) < 10:
@@ -52,18 +61,16 @@ class SimpleLLM(LLM):
             # 实际应用中应替换为真实的LLM
             
             # 提取用户问的是哪一条法律条款
-            article_number = None
-            if "第" in question and "条" in question:
-                import re
-                match = re.search(r'第([一二三四五六七八九十百零\d]+)条', question)
-                if match:
-                    article_number = match.group(0)
+            match = ARTICLE_PATTERN.search(question)
+            article_number = match.group(0) if match else None
             
             # 从上下文中找到匹配的条款
             relevant_article = None
-            if article_number:
-                import re
-                # 尝试从上下文中找到精确匹配的法条
+            if article_number and article_index is not None:
+                # 直接按法条编号查找
+                relevant_article = article_index.get(article_number)
+            if article_number and not relevant_article:
+                # 没有索引或索引中未找到时，尝试从上下文中找到精确匹配的法条
                 lines = context.split('\n')
                 for line in lines:
                     if article_number in line:
@@ -86,6 +93,24 @@ class SimpleLLM(LLM):
             # 异常处理，返回一个安全的回答
             return "抱歉，我无法处理您的问题。请确保您的问题清晰明确，并尝试重新提问。"
 
+    def _stream(
+        self,
+        prompt: str,
+        stop: Optional[List[str]] = None,
+        run_manager: Optional[CallbackManagerForLLMRun] = None,
+        **kwargs: Any,
+    ) -> Iterator[GenerationChunk]:
+        """
+        逐字流式输出回答
+        演示实现先生成完整回答再逐字返回，真实的LLM应直接转发API的流式输出
+        """
+        answer = self._call(prompt, stop=stop, run_manager=run_manager, **kwargs)
+        for char in answer:
+            chunk = GenerationChunk(text=char)
+            if run_manager:
+                run_manager.on_llm_new_token(chunk.text, chunk=chunk)
+            yield chunk
+
     @property
     def _identifying_params(self) -> Mapping[str, Any]:
         """Get the identifying parameters."""
@@ -7,17 +7,26 @@
 import re
 import os
 import sys
+import json
+import html
+import functools
 from pathlib import Path
-from typing import List, Tuple, Dict, Any
+from typing import List, Tuple, Dict, Any, Optional
 
-from langchain_core.runnables import RunnableParallel, RunnablePassthrough
+import chromadb
+import numpy as np
 from langchain_core.prompts import PromptTemplate
-from langchain_community.vectorstores import Chroma
-from langchain_community.embeddings import HuggingFaceEmbeddings
 from langchain_community.embeddings import FakeEmbeddings  # 添加备用嵌入模型
 
 # 本地模块
-from .llm import SimpleLLM
+from .llm import SimpleLLM, ARTICLE_PATTERN
+from .embeddings import (
+    ONNXEmbeddings,
+    SentenceTransformerEmbeddings,
+    CUDA_AVAILABLE,
+    ONNX_MODEL_DIR,
+    ONNX_RUNTIME_AVAILABLE,
+)
 
 # --- 全局配置 ---
 # 获取项目根目录
@@ -28,6 +37,15 @@ VECTOR_STORE_DIR = BASE_DIR / "vector_store"
 EMBEDDING_MODEL_NAME = 'infgrad/stella-base-zh-v2'
 # 定义集合名称
 COLLECTION_NAME = "legal_documents"
+# 精确检索使用的向量矩阵和元数据文件（由 embedding/process.py 生成）
+EMBEDDINGS_FILE = VECTOR_STORE_DIR / "embeddings.npy"
+METADATA_FILE = VECTOR_STORE_DIR / "metadata.jsonl"
+# 检索结果缓存的最大问题数
+RETRIEVAL_CACHE_SIZE = 256
+# 前端显示源文档内容的最大字符数
+SOURCE_PREVIEW_LENGTH = 500
+# 连续的空白字符
+WHITESPACE_PATTERN = re.compile(r'\s+')
 
 # --- 提示模板 ---
 TEMPLATE = """
@@ -69,49 +87,100 @@ class LegalQAChain:
         self.llm.temperature = temperature
         
         # 初始化嵌入模型
+        self.embedding_model = self._load_embedding_model()
+
+        # 初始化向量索引：优先使用内存中的向量矩阵做精确检索，
+        # 没有导出矩阵时再使用Chroma（直接使用chromadb客户端，与索引时相同）
+        self.top_k = top_k
+        self.index_embeddings, self.index_records = self._load_numpy_index()
+        self.collection = None
+        if self.index_embeddings is None:
+            self.client = chromadb.PersistentClient(path=str(VECTOR_STORE_DIR))
+            self.collection = self.client.get_or_create_collection(name=COLLECTION_NAME)
+
+        # 按实例缓存检索结果，重复提问时跳过嵌入计算和向量检索
+        self._cached_query = functools.lru_cache(maxsize=RETRIEVAL_CACHE_SIZE)(self._query)
+
+    @staticmethod
+    def _load_embedding_model() -> Any:
+        """
+        加载嵌入模型：有GPU时使用GPU上的SentenceTransformer模型；
+        仅有CPU时优先使用量化后的ONNX模型，最后使用备用的随机嵌入模型
+        """
+        # 仅有CPU时，优先使用量化后的ONNX模型
+        if not CUDA_AVAILABLE and ONNX_RUNTIME_AVAILABLE and ONNX_MODEL_DIR.exists():
+            try:
+                print("正在加载量化ONNX嵌入模型...")
+                return ONNXEmbeddings(ONNX_MODEL_DIR)
+            except Exception as e:
+                print(f"无法加载ONNX模型，错误: {e}")
+
         try:
             print("正在尝试加载在线嵌入模型...")
-            self.embedding_model = HuggingFaceEmbeddings(
-                model_name=EMBEDDING_MODEL_NAME,
-                model_kwargs={'device': 'cpu'} # 或者 'cuda' 如果有GPU
-            )
+            # 有GPU时自动使用GPU，输出单位向量，与索引时一致
+            return SentenceTransformerEmbeddings(EMBEDDING_MODEL_NAME)
         except Exception as e:
             print(f"无法加载在线模型，错误: {e}")
             print("使用本地备用嵌入模型...")
             # 使用简单的备用嵌入模型
-            self.embedding_model = FakeEmbeddings(size=384)  # 使用与原模型相同的维度
+            return FakeEmbeddings(size=384)  # 使用与原模型相同的维度
 
-        # 初始化向量数据库
-        self.vectorstore = Chroma(
-            collection_name=COLLECTION_NAME,
-            persist_directory=str(VECTOR_STORE_DIR),
-            embedding_function=self.embedding_model
-        )
-        
-        # 初始化检索器
-        self.retriever = self.vectorstore.as_retriever(
-            search_type="similarity",
-            search_kwargs={'k': top_k}
-        )
+    @staticmethod
+    def _load_numpy_index() -> Tuple[Optional[np.ndarray], List[Tuple[str, Dict[str, Any]]]]:
+        """
+        加载向量矩阵和对应的 (文档内容, 元数据) 列表，文件不存在时返回 (None, [])
+        """
+        if not (EMBEDDINGS_FILE.exists() and METADATA_FILE.exists()):
+            return None, []
 
-        # 构建问答链 (LCEL - LangChain Expression Language)
-        self.chain = (
-            RunnableParallel(
-                context=(self.retriever | self._format_docs),
-                question=RunnablePassthrough()
-            )
-            | QA_PROMPT
-            | self.llm
+        embeddings = np.load(EMBEDDINGS_FILE).astype(np.float32, copy=False)
+        records = []
+        with open(METADATA_FILE, 'r', encoding='utf-8') as f:
+            for line in f:
+                record = json.loads(line)
+                records.append((record['text'], {'source': record['source']}))
+        return embeddings, records
+
+    def _retrieve(self, question: str) -> List[Tuple[str, Dict[str, Any]]]:
+        """
+        检索与问题最相关的文档，问题中的空白字符会先被规范化，
+        以便仅空白不同的重复提问命中缓存
+
+        Returns:
+            (文档内容, 元数据) 元组列表，按相似度从高到低排列
+        """
+        normalized_question = " ".join(question.split())
+        return list(self._cached_query(normalized_question, self.top_k))
+
+    def _query(self, question: str, top_k: int) -> Tuple[Tuple[str, Dict[str, Any]], ...]:
+        """计算问题的嵌入并查询向量数据库（未缓存）"""
+        query_embedding = self.embedding_model.embed_query(question)
+
+        if self.index_embeddings is not None:
+            # 向量均已归一化，内积即余弦相似度；一次矩阵向量乘法得到全部得分
+            scores = self.index_embeddings @ np.asarray(query_embedding, dtype=np.float32)
+            k = min(top_k, len(scores))
+            if k == 0:
+                return ()
+            top = np.argpartition(-scores, k - 1)[:k]
+            top = top[np.argsort(-scores[top])]
+            return tuple(self.index_records[i] for i in top)
+
+        results = self.collection.query(
+            query_embeddings=[query_embedding],
+            n_results=top_k,
+            include=['documents', 'metadatas']
         )
+        return tuple(zip(results['documents'][0], results['metadatas'][0]))
 
     @staticmethod
-    def _format_docs(docs: List[Any]) -> str:
+    def _format_docs(docs: List[Tuple[str, Dict[str, Any]]]) -> str:
         """格式化检索到的文档，确保法条内容清晰可读"""
         formatted_texts = []
         
-        for doc in docs:
+        for text, _ in docs:
             # 清理文本，去除多余空格和换行
-            content = doc.page_content.strip()
+            content = text.strip()
             
             # 检查是否包含法条编号
             if content.startswith("第") and "条" in content[:15]:
@@ -119,48 +188,124 @@ class LegalQAChain:
                 formatted_texts.append(content)
             else:
                 # 普通文本，确保没有奇怪的格式
-                cleaned = content.replace("\\n\\n", " ").replace("\\n", " ")
+                cleaned = content.replace("\n\n", " ").replace("\n", " ")
                 formatted_texts.append(cleaned)
                 
-        return "\\n\\n".join(formatted_texts)
+        return "\n\n".join(formatted_texts)
+
+    @staticmethod
+    def _build_article_index(docs: List[Tuple[str, Dict[str, Any]]]) -> Dict[str, str]:
+        """
+        建立 {法条编号: 法条全文} 索引。
+        每个分块都以"第X条"开头，因此只需匹配开头即可，LLM可直接按编号查找法条。
+        """
+        article_index = {}
+        for text, _ in docs:
+            content = text.strip()
+            match = ARTICLE_PATTERN.match(content)
+            if match:
+                article_index.setdefault(match.group(0), content)
+        return article_index
 
-    def _format_source_docs(self, docs: List[Any]) -> List[Dict[str, Any]]:
-        """格式化源文档，以便在前端显示"""
+    def _format_source_docs(self, docs: List[Tuple[str, Dict[str, Any]]]) -> List[Dict[str, Any]]:
+        """
+        格式化源文档，以便在前端显示。
+        内容截断和HTML片段在这里一次性生成，前端每次重新运行时直接使用
+        """
         source_docs = []
-        for doc in docs:
+        for text, metadata in docs:
             # 清理和格式化文本内容
-            content = re.sub(r'\\s+', ' ', doc.page_content).strip()
-            source = doc.metadata.get('source', '未知来源')
+            content = WHITESPACE_PATTERN.sub(' ', text).strip()
+            source = (metadata or {}).get('source', '未知来源')
             # 提取法条编号
-            article_match = re.search(r'^(第[一二三四五六七八九十百\\d]+条)', content)
-            article = article_match.group(1) if article_match else "相关条款"
+            article_match = ARTICLE_PATTERN.match(content)
+            article = article_match.group(0) if article_match else "相关条款"
+
+            # 如果内容太长，截断显示
+            if len(content) > SOURCE_PREVIEW_LENGTH:
+                content = content[:SOURCE_PREVIEW_LENGTH] + "..."
             
             source_docs.append({
                 "article": article,
                 "content": content,
-                "source": source
+                "source": source,
+                "html_blob": (
+                    "<div style='background-color: #f0f2f6; padding: 10px; border-radius: 5px;'>"
+                    f"{html.escape(content)}</div>"
+                )
             })
         return source_docs
 
-    def run(self, question: str, show_source: bool = True) -> Dict[str, Any]:
+    def _prepare(self, question: str) -> Tuple[str, Dict[str, str], List[Tuple[str, Dict[str, Any]]]]:
+        """
+        检索相关文档并构建提示
+
+        Returns:
+            (提示, 法条索引, 检索到的文档)
+        """
+        # 只检索一次，检索结果同时用于构建上下文和返回源文档
+        retrieved_docs = self._retrieve(question)
+        context = self._format_docs(retrieved_docs)
+        article_index = self._build_article_index(retrieved_docs)
+
+        prompt = QA_PROMPT.format(context=context, question=question)
+        return prompt, article_index, retrieved_docs
+
+    def _llm_kwargs(self, article_index: Dict[str, str], temperature: Optional[float]) -> Dict[str, Any]:
+        """
+        构建单次调用LLM的参数。
+        问答链是进程内共享的缓存对象，温度按调用传入，而不是修改共享的LLM实例。
+        法条索引只传给演示用的 SimpleLLM，真实的LLM会把额外参数转发给模型API
+        """
+        llm_kwargs = {}
+        if isinstance(self.llm, SimpleLLM):
+            llm_kwargs["article_index"] = article_index
+        if temperature is not None:
+            llm_kwargs["temperature"] = temperature
+        return llm_kwargs
+
+    def run(self, question: str, show_source: bool = True, temperature: Optional[float] = None) -> Dict[str, Any]:
         """
         执行问答链
 
         Args:
             question: 用户提出的问题
             show_source: 是否在结果中包含源文档
+            temperature: 本次调用的模型温度，为None时使用LLM的默认温度
 
         Returns:
             一个包含答案和可选源文档的字典
         """
-        # 调用检索器获取相关文档
-        retrieved_docs = self.retriever.invoke(question)
-        
-        # 调用链生成答案
-        answer = self.chain.invoke(question)
+        prompt, article_index, retrieved_docs = self._prepare(question)
+
+        # 生成答案
+        answer = self.llm.invoke(prompt, **self._llm_kwargs(article_index, temperature))
 
         result = {"answer": answer, "source_documents": []}
         if show_source:
             result["source_documents"] = self._format_source_docs(retrieved_docs)
             
-        return result 
\ No newline at end of file
+        return result
+
+    def stream(self, question: str, show_source: bool = True, temperature: Optional[float] = None) -> Dict[str, Any]:
+        """
+        以流式方式执行问答链：检索立即完成，答案在迭代时逐步生成
+
+        Args:
+            question: 用户提出的问题
+            show_source: 是否在结果中包含源文档
+            temperature: 本次调用的模型温度，为None时使用LLM的默认温度
+
+        Returns:
+            一个包含答案生成器（answer_stream）和可选源文档的字典
+        """
+        prompt, article_index, retrieved_docs = self._prepare(question)
+
+        result = {
+            "answer_stream": self.llm.stream(prompt, **self._llm_kwargs(article_index, temperature)),
+            "source_documents": []
+        }
+        if show_source:
+            result["source_documents"] = self._format_source_docs(retrieved_docs)
+
+        return result
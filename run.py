@@ -9,7 +9,6 @@ import os
 import sys
 import argparse
 from pathlib import Path
-import subprocess
 
 # 配置路径
 BASE_DIR = Path(__file__).parent
@@ -34,14 +33,19 @@ def run_app():
     print("启动Streamlit应用...")
     app_path = BASE_DIR / "app" / "main.py"
     try:
-        subprocess.run(["streamlit", "run", str(app_path)], check=True)
-    except subprocess.CalledProcessError as e:
-        print(f"启动Streamlit应用失败: {e}")
-        sys.exit(1)
-    except FileNotFoundError:
+        from streamlit import config
+        from streamlit.web import bootstrap
+    except ImportError:
         print("错误: 未找到Streamlit。请确保已安装所有依赖: pip install -r requirements.txt")
         sys.exit(1)
 
+    # 与 `streamlit run` 一致：先记录脚本路径并加载配置，使脚本目录下的 .streamlit/config.toml 生效
+    config._main_script_path = str(app_path)
+    bootstrap.load_config_options(flag_options={})
+
+    # 在当前进程中启动Streamlit服务器，避免再启动一个Python解释器
+    bootstrap.run(str(app_path), is_hello=False, args=[], flag_options={})
+
 
 def main():
     """主函数"""
@@ -0,0 +1,45 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+将句向量模型导出为 ONNX 格式，并进行 int8 动态量化，用于 CPU 推理。
+等价于: optimum-cli export onnx --model infgrad/stella-base-zh-v2 --task feature-extraction <dir>
+"""
+
+import sys
+from pathlib import Path
+
+from optimum.onnxruntime import ORTModelForFeatureExtraction, ORTQuantizer
+from optimum.onnxruntime.configuration import AutoQuantizationConfig
+from transformers import AutoTokenizer
+
+# --- 配置 ---
+BASE_DIR = Path(__file__).resolve().parent.parent
+sys.path.append(str(BASE_DIR))
+
+from rag.embeddings import ONNX_MODEL_DIR
+
+EMBEDDING_MODEL_NAME = 'infgrad/stella-base-zh-v2'
+EXPORT_DIR = BASE_DIR / "models" / "stella-base-zh-v2-onnx"
+
+
+def export_and_quantize():
+    """导出ONNX模型并进行动态int8量化"""
+    print(f"正在导出模型 {EMBEDDING_MODEL_NAME} 为ONNX格式...")
+    model = ORTModelForFeatureExtraction.from_pretrained(EMBEDDING_MODEL_NAME, export=True)
+    tokenizer = AutoTokenizer.from_pretrained(EMBEDDING_MODEL_NAME)
+    model.save_pretrained(EXPORT_DIR)
+    tokenizer.save_pretrained(EXPORT_DIR)
+
+    # 动态量化（is_static=False），利用 AVX512-VNNI 指令加速int8矩阵运算
+    print("正在进行int8动态量化...")
+    quantizer = ORTQuantizer.from_pretrained(EXPORT_DIR)
+    qconfig = AutoQuantizationConfig.avx512_vnni(is_static=False, per_channel=False)
+    quantizer.quantize(save_dir=ONNX_MODEL_DIR, quantization_config=qconfig)
+    tokenizer.save_pretrained(ONNX_MODEL_DIR)
+
+    print(f"成功！量化后的模型已保存至: {ONNX_MODEL_DIR}")
+
+
+if __name__ == "__main__":
+    export_and_quantize()
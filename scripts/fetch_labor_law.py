@@ -6,6 +6,7 @@
 使用 Selenium 来应对动态加载的页面。
 """
 
+import re
 import time
 from pathlib import Path
 from bs4 import BeautifulSoup
@@ -20,6 +21,10 @@ BASE_DIR = Path(__file__).resolve().parent.parent
 DATA_DIR = BASE_DIR / "data"
 URL = "http://www.gov.cn/banshi/2005-05/25/content_905.htm"
 OUTPUT_FILE = DATA_DIR / "labor_law_full.txt"
+# 页脚和分享链接等无关信息的起始标记，正文在第一个标记处截断
+STOP_MARKER_PATTERN = re.compile(r'【E-mail推荐|【打印】|【关闭】')
+# 连续的空行（含仅有空白字符的行）
+BLANK_LINES_PATTERN = re.compile(r'\n\s*\n')
 
 def fetch_law_text_with_selenium():
     """
@@ -66,17 +71,9 @@ def fetch_law_text_with_selenium():
         raw_text = content_div.get_text(separator='\n', strip=True)
         
         # --- 文本清理 ---
-        text_lines = raw_text.split('\n')
-        
-        cleaned_lines = []
-        for line in text_lines:
-            # 过滤掉页脚和分享链接等无关信息
-            if "【E-mail推荐" in line or "【打印】" in line or "【关闭】" in line:
-                break
-            if line: # 只添加非空行
-                cleaned_lines.append(line.strip())
-        
-        full_text = "\n".join(cleaned_lines)
+        # 在第一个页脚标记处截断，并合并多余的空行
+        cleaned_text = STOP_MARKER_PATTERN.split(raw_text, maxsplit=1)[0]
+        full_text = BLANK_LINES_PATTERN.sub('\n', cleaned_text).strip()
 
         # 确保data目录存在
         DATA_DIR.mkdir(exist_ok=True, parents=True)